@@ -1,36 +1,96 @@
 # app.py - This is your Receiving App's code with Firestore integration
 
-from flask import Flask, request, jsonify
+from flask import Flask, Blueprint, Response, g, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from flask_compress import Compress
+import orjson
 import datetime
-import random
 import firebase_admin
 from firebase_admin import credentials, firestore
 import os # Import os module to handle environment variables
-import json # Import json module to parse the credentials string
+import atexit
+import itertools
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait as wait_for_futures
+from dataclasses import dataclass
+from google.api_core import exceptions as api_exceptions
+from google.cloud.firestore_v1.bulk_batch import BulkWriteBatch
+from google.rpc import code_pb2
+from cachetools import TTLCache
+
+# Encode/decode JSON with orjson (a C extension) instead of the stdlib json module.
+# Anything orjson can't encode the same way as Flask's default provider (dates and datetimes,
+# including Firestore's DatetimeWithNanoseconds, Decimals, ...) goes through the provider's
+# `default` hook, so responses look exactly as they did before (and app-level overrides still apply).
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+class ORJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        option = ORJSON_OPTIONS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'): # response() asks for indented output in debug mode
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
+# Orders and lookups are small; reject anything bigger before it reaches our code
+MAX_JSON_BODY_SIZE = 64 * 1024
+app.config['MAX_CONTENT_LENGTH'] = MAX_JSON_BODY_SIZE
+# Compress JSON replies (Brotli if the browser supports it, gzip otherwise); tiny replies aren't worth it
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_BR_LEVEL'] = 4
+app.config['COMPRESS_MIN_SIZE'] = 500
+Compress(app)
 # Enable CORS for your app, allowing all origins for initial deployment.
 # IMPORTANT: For production, replace "*" with your specific Firebase Hosting domain (e.g., "https://your-project-id.web.app")
 CORS(app, resources={r"/*": {"origins": "*"}}) #
 
+# --- Logging ---
+# Request handlers log through a queue so they never block on writing to stdout;
+# a background listener thread does the actual writing.
+logger = logging.getLogger('kpl')
+logger.setLevel(logging.INFO) # Switch to logging.DEBUG to see per-order details
+logger.propagate = False
+_log_queue = queue.SimpleQueue()
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
 # --- Firebase Initialization ---
 # The 'firebase_credentials.json' file is NOT uploaded to GitHub for security.
 # Instead, its content is provided via the FIREBASE_CREDENTIALS environment variable on Render.
 
 # Attempt to get the JSON string from the environment variable
+db = None
+cred_dict = None # Parsed once and kept, so the Firestore client pool below can reuse it
 firebase_credentials_json = os.environ.get('FIREBASE_CREDENTIALS')
 
+# Shared by both credential sources below: set up the Firebase app once (so reloading this module is safe)
+def init_firestore(cred_dict):
+    if not firebase_admin._apps:
+        cred = credentials.Certificate(cred_dict)
+        firebase_admin.initialize_app(cred) # Use firebase_admin.initialize_app
+    return firestore.client()
+
 if firebase_credentials_json:
     try:
         # Parse the JSON string into a Python dictionary
-        cred_dict = json.loads(firebase_credentials_json)
+        cred_dict = orjson.loads(firebase_credentials_json)
         # Initialize Firebase Admin SDK with the dictionary
-        cred = credentials.Certificate(cred_dict)
-        firebase_admin.initialize_app(cred) # Use firebase_admin.initialize_app
-        db = firestore.client()
+        db = init_firestore(cred_dict)
         print("Firebase initialized successfully from environment variable.")
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         print(f"Error parsing FIREBASE_CREDENTIALS JSON: {e}")
         # In a real application, you might want to raise an exception or exit here
     except Exception as e:
@@ -42,126 +102,445 @@ else:
     # and if you still have firebase_credentials.json file locally.
     print("FIREBASE_CREDENTIALS environment variable not found. Attempting local file for testing purposes...")
     try:
-        cred = credentials.Certificate("firebase_credentials.json")
-        firebase_admin.initialize_app(cred) # Use firebase_admin.initialize_app
-        db = firestore.client()
+        with open("firebase_credentials.json", "rb") as f:
+            cred_dict = orjson.loads(f.read())
+        db = init_firestore(cred_dict)
         print("Firebase initialized successfully from local file (for local testing).")
     except Exception as e:
         print(f"Error: Firebase initialization failed. No environment variable and no local file found. {e}")
         # If your app can't function without Firebase, you might want to exit or raise an exception here.
 
+# Resolve the 'orders' collection and the server timestamp sentinel once, instead of on every request
+ORDERS = db.collection('orders') if db is not None else None
+SERVER_TIMESTAMP = firestore.SERVER_TIMESTAMP
 
-# This is the 'listening' part. It listens for messages sent to '/receive-order'
-@app.route('/receive-order', methods=['POST'])
-def handle_order_request():
-    print("Someone sent a message to my Receiving App!")
+# --- Firestore Client Pool ---
+# One client means one gRPC channel shared by every request, which becomes the bottleneck under load.
+# Order lookups are spread round-robin over a few independently built clients (one channel each).
+# Writes don't need this: they are batched below, and several batches can be in flight at once.
+FIRESTORE_POOL_SIZE = int(os.environ.get('FIRESTORE_POOL_SIZE', min(8, (os.cpu_count() or 1) * 2)))
+
+def _build_pooled_client():
+    return firestore.Client.from_service_account_info(cred_dict)
+
+_order_collections = []
+if ORDERS is not None:
+    _order_collections.append(ORDERS)
+    for _ in range(FIRESTORE_POOL_SIZE - 1):
+        try:
+            _order_collections.append(_build_pooled_client().collection('orders'))
+        except Exception as e:
+            print(f"Error creating pooled Firestore client, continuing with {len(_order_collections)}: {e}")
+            break
+_order_collection_counter = itertools.count()
+
+def get_orders_collection():
+    return _order_collections[next(_order_collection_counter) % len(_order_collections)]
+
+# --- Batched Firestore Writes ---
+# Orders are queued in memory instead of doing one `set()` round-trip per request.
+# A background thread wakes up when something is queued, waits a few milliseconds for more, and
+# hands everything due to a small thread pool as BatchWrite RPCs (the same non-atomic RPC BulkWriter
+# uses). Concurrent orders share a round-trip, one failed write doesn't fail the others, and up to
+# ORDER_SEND_THREADS batches are in flight at once, so one slow commit doesn't hold up the rest.
+# Sending and retrying are driven here rather than by a BulkWriter, whose flush()/close()
+# lifecycle doesn't suit a queue that lives as long as the worker.
+ORDER_WRITE_TIMEOUT = 2 # Seconds a request waits for its order to be confirmed by Firestore
+ORDER_WRITE_MAX_ATTEMPTS = 3 # Sends per write, including the first, before giving up
+ORDER_WRITE_RETRY_DELAY = 0.2 # Linear backoff (0.2 s, then 0.4 s), so retries finish within the timeout
+ORDER_FLUSH_INTERVAL = 0.01 # Coalesce writes arriving within a 10 ms window
+ORDER_BATCH_SIZE = 500 # The most writes Firestore accepts in one BatchWrite
+ORDER_SEND_THREADS = 8 # BatchWrite RPCs that can be in flight at the same time
+
+# Only transient failures are retried; anything else (e.g. ALREADY_EXISTS on a serial collision,
+# INVALID_ARGUMENT, PERMISSION_DENIED) fails the order straight away
+RETRYABLE_WRITE_CODES = {
+    code_pb2.ABORTED,
+    code_pb2.DEADLINE_EXCEEDED,
+    code_pb2.INTERNAL,
+    code_pb2.RESOURCE_EXHAUSTED,
+    code_pb2.UNAVAILABLE,
+}
+RETRYABLE_RPC_ERRORS = (
+    api_exceptions.Aborted,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.InternalServerError,
+    api_exceptions.ResourceExhausted,
+    api_exceptions.ServiceUnavailable,
+)
+
+# Raised by save_order when a document with that serial number already exists
+class OrderAlreadyExists(Exception):
+    pass
 
+@dataclass
+class _QueuedWrite:
+    order_ref: object
+    data: dict
+    future: Future # Resolved with the WriteResult, or failed with the error
+    deadline: float # time.monotonic() after which the request is no longer waiting
+    attempts: int = 0
+    run_at: float = 0.0 # Not sent before this time.monotonic() value (used for retry backoff)
+
+_queued_writes = [] # New writes and scheduled retries, waiting for the next flush
+_queued_writes_lock = threading.Lock()
+_writes_queued = threading.Event() # Set whenever a write or retry is queued, to wake the flusher
+_send_executor = ThreadPoolExecutor(max_workers=ORDER_SEND_THREADS, thread_name_prefix='order-writes')
+
+def _queue_write(write):
+    with _queued_writes_lock:
+        _queued_writes.append(write)
+    _writes_queued.set()
+
+def _next_due_time():
+    with _queued_writes_lock:
+        return min((write.run_at for write in _queued_writes), default=None)
+
+def _take_due_writes(due_by):
+    with _queued_writes_lock:
+        due = [write for write in _queued_writes if write.run_at <= due_by]
+        if due:
+            _queued_writes[:] = [write for write in _queued_writes if write.run_at > due_by]
+    return due
+
+def _retry_or_fail(write, error, retryable):
+    write.attempts += 1
+    run_at = time.monotonic() + ORDER_WRITE_RETRY_DELAY * write.attempts
+    if retryable and write.attempts < ORDER_WRITE_MAX_ATTEMPTS and run_at < write.deadline:
+        write.run_at = run_at
+        _queue_write(write)
+    else:
+        write.future.set_exception(error)
+
+def _send_batch(writes):
+    batch = BulkWriteBatch(db)
+    sent = []
+    for write in writes:
+        try:
+            batch.create(write.order_ref, write.data)
+            sent.append(write)
+        except Exception as e:
+            write.future.set_exception(e) # e.g. data Firestore can't encode
+    if not sent:
+        return
+
+    try:
+        # retry=None: retries are handled below, so they stay within ORDER_WRITE_TIMEOUT
+        response = batch.commit(retry=None, timeout=ORDER_WRITE_TIMEOUT)
+    except Exception as e:
+        retryable = isinstance(e, RETRYABLE_RPC_ERRORS)
+        for write in sent:
+            _retry_or_fail(write, e, retryable)
+        return
+
+    for write, status, write_result in zip(sent, response.status, response.write_results):
+        if status.code == code_pb2.OK:
+            write.future.set_result(write_result)
+        elif status.code == code_pb2.ALREADY_EXISTS:
+            write.future.set_exception(OrderAlreadyExists(status.message))
+        else:
+            error = RuntimeError(f"{code_pb2.Code.Name(status.code)}: {status.message}")
+            _retry_or_fail(write, error, status.code in RETRYABLE_WRITE_CODES)
+
+def _send_batch_or_fail(writes):
+    # Runs on the send pool, where an unexpected error would otherwise vanish into the pool's future
     try:
-        order_data = request.get_json()
-        if not order_data:
-            return jsonify({"success": False, "message": "No data received or data is not JSON."}), 400
+        _send_batch(writes)
     except Exception as e:
-        print(f"Error parsing JSON: {e}")
+        logger.error("Error sending orders to Firestore: %s", e)
+        for write in writes:
+            if not write.future.done():
+                write.future.set_exception(e)
+
+def flush_order_writes(due_by=None):
+    # Hand every queued write that is due (by default: due now) to the send pool.
+    # Returns the pool futures of the batches that were started.
+    writes = _take_due_writes(time.monotonic() if due_by is None else due_by)
+    # Drop first attempts whose request already gave up waiting (their futures were cancelled)
+    writes = [write for write in writes if write.attempts or write.future.set_running_or_notify_cancel()]
+    return [_send_executor.submit(_send_batch_or_fail, writes[start:start + ORDER_BATCH_SIZE])
+            for start in range(0, len(writes), ORDER_BATCH_SIZE)]
+
+def _flush_orders_when_queued():
+    wait_timeout = None
+    while True:
+        # Sleep until a write is queued or the next retry is due, rather than polling
+        _writes_queued.wait(wait_timeout)
+        time.sleep(ORDER_FLUSH_INTERVAL) # Let writes arriving close together share one batch
+        _writes_queued.clear()
+        try:
+            flush_order_writes()
+        except Exception as e:
+            # Keep the thread alive, otherwise no order in this worker would be saved again
+            logger.error("Error sending queued orders to Firestore: %s", e)
+        next_due = _next_due_time()
+        wait_timeout = None if next_due is None else max(0.0, next_due - time.monotonic())
+
+def _flush_all_order_writes():
+    # Make sure nothing queued is lost when the worker shuts down, including pending retries
+    for _ in range(ORDER_WRITE_MAX_ATTEMPTS):
+        batches = flush_order_writes(due_by=float('inf'))
+        if not batches:
+            break
+        wait_for_futures(batches)
+    _send_executor.shutdown(wait=True)
+
+def save_order(order_ref, order_data_to_save):
+    # Queue the write and block until Firestore confirms it (or the timeout expires)
+    future = Future()
+    write = _QueuedWrite(order_ref, order_data_to_save, future, time.monotonic() + ORDER_WRITE_TIMEOUT)
+    _queue_write(write)
+    try:
+        return future.result(timeout=ORDER_WRITE_TIMEOUT)
+    except FutureTimeoutError:
+        future.cancel() # If it hasn't been sent yet, the flusher drops it instead of saving it late
+        raise
+
+if db is not None:
+    threading.Thread(target=_flush_orders_when_queued, daemon=True).start()
+    atexit.register(_flush_all_order_writes)
+
+# --- Order Status Cache ---
+# Recently read (or just created) orders are kept in memory for a short while,
+# so repeated status lookups of the same serial don't go back to Firestore.
+ORDER_CACHE_TTL = 60 # Seconds an order stays cached
+order_cache = TTLCache(maxsize=10_000, ttl=ORDER_CACHE_TTL)
+_order_cache_lock = threading.RLock() # TTLCache is not thread-safe on its own
+
+def get_cached_order(serial_number):
+    with _order_cache_lock:
+        return order_cache.get(serial_number)
+
+def cache_order(serial_number, order_details):
+    with _order_cache_lock:
+        order_cache[serial_number] = order_details
+
+
+# --- Serial Number Helpers ---
+SERIAL_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+SERIAL_SUFFIX_LENGTH = 6 # 36**6 fits in 32 bits, so one 4-byte random draw is enough
+SERIAL_MAX_ATTEMPTS = 3 # Serial numbers tried per order before giving up on collisions
+
+def generate_serial_suffix():
+    # Turn a single 32-bit random number into 6 base-36 characters
+    value = int.from_bytes(os.urandom(4), 'big')
+    chars = []
+    for _ in range(SERIAL_SUFFIX_LENGTH):
+        value, index = divmod(value, 36)
+        chars.append(SERIAL_ALPHABET[index])
+    return ''.join(chars)
+
+# The prefix only changes once a day, so remember it instead of formatting it for every order.
+# The (date, prefix) pair is swapped in as one tuple, so threaded workers can share it without a lock.
+_prefix_cache = (None, None)
+
+def get_serial_prefix():
+    global _prefix_cache
+    today = datetime.date.today()
+    cached_date, prefix = _prefix_cache
+    if cached_date != today:
+        prefix = "KPL-" + today.strftime("%y%m%d")
+        _prefix_cache = (today, prefix)
+    return prefix
+
+# Firestore timestamps come back as timezone-aware UTC datetimes; the frontend expects
+# "YYYY-MM-DD HH:MM:SS" without an offset. isoformat() does this in C, unlike strftime().
+def format_order_date(value):
+    return value.replace(tzinfo=None).isoformat(sep=' ', timespec='seconds')
+
+# Check, in one pass, that the submitted tests are a list of objects. The tests are saved and
+# echoed back exactly as sent (including any fields beyond name/id/price), so nothing is copied here.
+def is_valid_tests(tests):
+    return isinstance(tests, list) and all(isinstance(test, dict) for test in tests)
+
+# Cheap checks on the request headers, so requests that can't be valid JSON are turned away
+# without reading or parsing the body
+def is_json_request():
+    return request.mimetype == 'application/json' and (request.content_length or 0) <= MAX_JSON_BODY_SIZE
+
+
+# --- API Endpoints ---
+# All endpoints live on one blueprint, so the JSON body is read and parsed once in before_request
+# and the handlers just use g.payload.
+api = Blueprint('api', __name__)
+
+# Returns (payload, error): the parsed JSON object (or None if there isn't one),
+# and whether a JSON body was sent but couldn't be parsed
+def read_json_payload():
+    if not is_json_request():
+        return None, False
+    try:
+        payload = orjson.loads(request.get_data(cache=False))
+    except orjson.JSONDecodeError as e:
+        logger.warning("Error parsing JSON: %s", e)
+        return None, True
+    return (payload if isinstance(payload, dict) else None), False
+
+@api.before_request
+def parse_json_payload():
+    g.payload, g.payload_error = read_json_payload()
+
+# This is the 'listening' part. It listens for messages sent to '/receive-order'
+@api.route('/receive-order', methods=['POST'])
+def handle_order_request():
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Someone sent a message to my Receiving App!")
+
+    if g.payload_error:
         return jsonify({"success": False, "message": "Invalid JSON format."}), 400
+    order_data = g.payload
+    if not order_data:
+        return jsonify({"success": False, "message": "No data received or data is not JSON."}), 400
 
     patient_name = order_data.get('patientName', 'N/A')
     phone_number = order_data.get('phoneNumber', 'N/A')
     email_address = order_data.get('emailAddress', 'N/A')
     selected_tests = order_data.get('tests', [])
+    if not is_valid_tests(selected_tests):
+        return jsonify({"success": False, "message": "Tests must be a list of test objects."}), 400
 
-    print(f"--- Received Order Details ---")
-    print(f"Patient Name: {patient_name}")
-    print(f"Phone Number: {phone_number}")
-    print(f"Email: {email_address}")
-    print(f"Selected Tests:")
-    for test in selected_tests:
-        print(f"  - {test.get('name')} (ID: {test.get('id')}, Price: {test.get('price')})")
-    print(f"----------------------------")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("--- Received Order Details ---")
+        logger.debug("Patient Name: %s", patient_name)
+        logger.debug("Phone Number: %s", phone_number)
+        logger.debug("Email: %s", email_address)
+        # The test list can be long, so only log it when running with debug=True
+        if app.debug:
+            logger.debug("Selected Tests: %s", selected_tests)
+        logger.debug("----------------------------")
 
-    # Your Receiving App creates the official serial number
-    today = datetime.date.today()
-    serial_prefix = "KPL-" + today.strftime("%y%m%d") # e.g., KPL-250531
-    random_suffix = ''.join(random.choices('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ', k=6)) # 6 random chars
-    official_serial_number = f"{serial_prefix}-{random_suffix}"
+    for _ in range(SERIAL_MAX_ATTEMPTS):
+        # Your Receiving App creates the official serial number
+        serial_prefix = get_serial_prefix() # e.g., KPL-250531
+        random_suffix = generate_serial_suffix() # 6 random chars
+        official_serial_number = f"{serial_prefix}-{random_suffix}"
 
-    print(f"Generated Official Serial Number: {official_serial_number}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Generated Official Serial Number: %s", official_serial_number)
 
-    # --- SAVE ORDER TO FIRESTORE ---
-    try:
-        # Create a new document in the 'orders' collection with the serial number as its ID
-        order_ref = db.collection('orders').document(official_serial_number)
-        order_data_to_save = {
-            "serialNumber": official_serial_number,
-            "patientName": patient_name,
-            "phoneNumber": phone_number,
-            "emailAddress": email_address,
-            "tests": selected_tests, # Save the list of test objects
-            "orderDate": firestore.SERVER_TIMESTAMP # Automatically adds server timestamp
-        }
-        order_ref.set(order_data_to_save)
-        print(f"Order {official_serial_number} saved to Firestore.")
-    except Exception as e:
-        print(f"Error saving order to Firestore: {e}")
-        # Log the error, but for now we'll allow the response to proceed.
+        # --- SAVE ORDER TO FIRESTORE ---
+        try:
+            # Create a new document in the 'orders' collection with the serial number as its ID
+            order_ref = ORDERS.document(official_serial_number)
+            order_data_to_save = {
+                "serialNumber": official_serial_number,
+                "patientName": patient_name,
+                "phoneNumber": phone_number,
+                "emailAddress": email_address,
+                "tests": selected_tests, # Save the list of test objects
+                "orderDate": SERVER_TIMESTAMP # Automatically adds server timestamp
+            }
+            save_order(order_ref, order_data_to_save)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Order %s saved to Firestore.", official_serial_number)
+            # Pre-populate the cache so the confirmation page lookup is served from memory.
+            # The write has been encoded and confirmed by now, so the same dict is reused for the cache
+            # instead of copying it. The server timestamp isn't known here, so use the current UTC time.
+            order_data_to_save["orderDate"] = format_order_date(datetime.datetime.now(datetime.timezone.utc))
+            cache_order(official_serial_number, order_data_to_save)
+            break
+        except OrderAlreadyExists:
+            # The serial belongs to another patient's order; never hand it out, try a new one instead
+            logger.warning("Serial number %s is already taken, generating a new one.", official_serial_number)
+        except Exception as e:
+            logger.error("Error saving order to Firestore: %s", e)
+            # Log the error, but for now we'll allow the response to proceed.
+            break
+    else:
+        return jsonify({"success": False, "message": "Could not create a unique serial number. Please try again."}), 500
 
-    # Send a success message back to your website, including the official serial number
-    return jsonify({
+    # Send a success message back to your website, including the official serial number.
+    # The whole reply (tests included) is encoded to bytes in a single orjson call.
+    return Response(orjson.dumps({
         "success": True,
         "message": "Order received successfully by Receiving App!",
         "serialNumber": official_serial_number, # Send the official serial number back
         "patientName": patient_name, # Also send patient name for confirmation display
         "selected_tests": selected_tests # Also send tests for confirmation display
-    }), 200
+    }), status=200, mimetype='application/json')
 
-# New endpoint to get order details by serial number from Firestore
-@app.route('/get-order-status', methods=['POST'])
-def get_order_status():
-    try:
-        request_data = request.get_json()
-        serial_number = request_data.get('serialNumber')
+# Orders don't change after they are created, so successful GET lookups can be cached by
+# browsers and CDNs (e.g. Firebase Hosting) instead of reaching Flask and Firestore every time
+ORDER_STATUS_CACHE_CONTROL = 'public, max-age=300, stale-while-revalidate=60'
 
-        if not serial_number:
-            return jsonify({"status": "error", "message": "Serial number is required."}), 400
+# Shared by both order status endpoints; returns a (response, status code) pair
+def lookup_order(serial_number):
+    try:
+        # Operators can pass ?fresh=1 to skip the cache and read straight from Firestore
+        if request.args.get('fresh') != '1':
+            order_details = get_cached_order(serial_number)
+            if order_details is not None:
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Order %s served from cache.", serial_number)
+                return jsonify({"status": "success", "order": order_details}), 200
 
-        print(f"Attempting to retrieve order: {serial_number}")
-        order_ref = db.collection('orders').document(serial_number)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Attempting to retrieve order: %s", serial_number)
+        order_ref = get_orders_collection().document(serial_number)
         order_doc = order_ref.get()
 
         if order_doc.exists:
             order_details = order_doc.to_dict()
-            print(f"Order {serial_number} found in Firestore.")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Order %s found in Firestore.", serial_number)
             # Convert Firestore timestamp to a readable string if needed by frontend
-            if 'orderDate' in order_details and hasattr(order_details['orderDate'], 'strftime'):
-                order_details['orderDate'] = order_details['orderDate'].strftime("%Y-%m-%d %H:%M:%S")
+            order_date = order_details.get('orderDate')
+            if isinstance(order_date, datetime.datetime):
+                order_details['orderDate'] = format_order_date(order_date)
+            cache_order(serial_number, order_details)
             return jsonify({"status": "success", "order": order_details}), 200
         else:
-            print(f"Order {serial_number} not found in Firestore.")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Order %s not found in Firestore.", serial_number)
             return jsonify({"status": "error", "message": "Order not found."}), 404
     except Exception as e:
-        print(f"Error retrieving order from Firestore: {e}")
+        logger.error("Error retrieving order from Firestore: %s", e)
         return jsonify({"status": "error", "message": f"Internal server error: {e}"}), 500
 
+# New endpoint to get order details by serial number from Firestore
+@api.route('/get-order-status', methods=['POST'])
+def get_order_status():
+    request_data = g.payload
+    if request_data is None:
+        return jsonify({"status": "error", "message": "Request must be JSON."}), 400
+
+    serial_number = request_data.get('serialNumber')
+    if not serial_number:
+        return jsonify({"status": "error", "message": "Serial number is required."}), 400
+
+    return lookup_order(serial_number)
+
+# Cacheable version of the endpoint above: GET /get-order-status/KPL-250531-AB12CD
+@api.route('/get-order-status/<serial_number>', methods=['GET'])
+def get_order_status_by_serial(serial_number):
+    response, status_code = lookup_order(serial_number)
+    if status_code == 200:
+        response.headers['Cache-Control'] = ORDER_STATUS_CACHE_CONTROL
+    return response, status_code
+
 # Placeholder for AI Interpretation and Health Tips (frontend now calls Gemini directly)
-@app.route('/interpret-report', methods=['POST'])
+@api.route('/interpret-report', methods=['POST'])
 def interpret_report():
-    if request.is_json:
-        data = request.get_json()
+    data = g.payload
+    if data is not None:
         report_text = data.get('report_text', '')
         print(f"Received report text for interpretation (backend mock): {report_text}")
         mock_interpretation = f"Backend Mock Interpretation for '{report_text}': This response came from your Python backend. Frontend now calls Gemini directly for AI features."
         return jsonify({"status": "success", "interpretation": mock_interpretation}), 200
     return jsonify({"status": "error", "message": "Invalid request"}), 400
 
-@app.route('/generate-health-tips', methods=['POST'])
+@api.route('/generate-health-tips', methods=['POST'])
 def generate_health_tips():
-    if request.is_json:
-        data = request.get_json()
+    data = g.payload
+    if data is not None:
         health_goal = data.get('health_goal', '')
         print(f"Received health goal for tips (backend mock): {health_goal}")
         mock_tips = f"Backend Mock Health Tips for '{health_goal}': This response came from your Python backend. Frontend now calls Gemini directly for AI features."
         return jsonify({"status": "success", "tips": mock_tips}), 200
     return jsonify({"status": "error", "message": "Invalid request"}), 400
 
+app.register_blueprint(api)
+
 # IMPORTANT: This block should be commented out or removed for Cloud Run/Render deployment.
 # if __name__ == '__main__':
 #     app.run(debug=True, port=5000)
@@ -0,0 +1,12 @@
+# gunicorn.conf.py - gunicorn picks this file up automatically when started as `gunicorn app:app`
+
+import os
+
+# Each request spends most of its time waiting on Firestore, so use threaded workers:
+# one worker process can then keep many Firestore RPCs in flight instead of one at a time.
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 32))
+
+# Keep idle connections from the frontend open for a few seconds so they can be reused
+keepalive = 5
@@ -0,0 +1,313 @@
+# Tests for app.py: JSON encoding, the batched Firestore order writes and the order endpoints.
+# Firestore is never contacted: BulkWriteBatch.commit is replaced by a fake that answers per write,
+# and the endpoint tests fake save_order and the orders collection.
+# Run from the repository root with: python -m pytest (or python -m unittest discover tests)
+
+import datetime
+import decimal
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from unittest import mock
+
+from google.api_core import exceptions as api_exceptions
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import firestore
+from flask.json.provider import DefaultJSONProvider
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from google.cloud.firestore_v1.types import BatchWriteResponse, write
+from google.rpc import code_pb2, status_pb2
+
+import app
+
+
+class ORJSONProviderTest(unittest.TestCase):
+    def test_matches_flask_default_provider(self):
+        payload = {
+            "orderDate": DatetimeWithNanoseconds(2025, 5, 31, 12, 3, 4, tzinfo=datetime.timezone.utc),
+            "tests": [{"name": "CBC", "price": decimal.Decimal("5.50"), "takenOn": datetime.date(2025, 5, 30)}],
+            "testsById": {1: "CBC", 2: "Lipid Profile"},
+        }
+        expected = DefaultJSONProvider(app.app).loads(DefaultJSONProvider(app.app).dumps(payload))
+        self.assertEqual(app.app.json.loads(app.app.json.dumps(payload)), expected)
+
+    def test_respects_an_overridden_default_hook(self):
+        with mock.patch.object(app.app.json, 'default', lambda value: "custom"):
+            self.assertEqual(app.app.json.dumps({"when": datetime.date(2025, 5, 30)}), '{"when":"custom"}')
+
+
+class FakeCommit:
+    # Stands in for BulkWriteBatch.commit. `outcome(serial, attempt)` returns a status code for
+    # a write, or an exception instance to make the whole RPC fail.
+    def __init__(self, outcome):
+        self.outcome = outcome
+        self.calls = [] # Serials sent in each commit call
+
+    def __call__(self, batch, retry=None, timeout=None):
+        serials = [write_pb.update.name.rsplit('/', 1)[-1] for write_pb in batch._write_pbs]
+        self.calls.append(serials)
+        codes = []
+        for serial in serials:
+            attempt = sum(serial in call for call in self.calls)
+            result = self.outcome(serial, attempt)
+            if isinstance(result, Exception):
+                raise result
+            codes.append(result)
+        return BatchWriteResponse(
+            write_results=[write.WriteResult() for _ in codes],
+            status=[status_pb2.Status(code=code, message="fake") for code in codes],
+        )
+
+
+class BatchedOrderWritesTest(unittest.TestCase):
+    def setUp(self):
+        db = firestore.Client(project='test-project', credentials=AnonymousCredentials())
+        patches = [
+            mock.patch.object(app, 'db', db),
+            mock.patch.object(app, 'ORDERS', db.collection('orders')),
+            mock.patch.object(app, 'ORDER_WRITE_RETRY_DELAY', 0.01),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        app._queued_writes.clear()
+
+    def use_commit(self, outcome):
+        fake = FakeCommit(outcome)
+        patch = mock.patch.object(app.BulkWriteBatch, 'commit', lambda batch, **kwargs: fake(batch, **kwargs))
+        patch.start()
+        self.addCleanup(patch.stop)
+        return fake
+
+    def save_orders(self, *serials):
+        # Runs save_order for each serial in its own thread, flushing until they all finish
+        with ThreadPoolExecutor(max_workers=len(serials)) as pool:
+            results = [pool.submit(app.save_order, app.ORDERS.document(serial), {"serialNumber": serial})
+                       for serial in serials]
+            # Let every request queue its write first, so they are sent together
+            while len(app._queued_writes) < len(serials) and not all(result.done() for result in results):
+                time.sleep(0.001)
+            while not all(result.done() for result in results):
+                app.flush_order_writes()
+                time.sleep(0.005)
+        return results
+
+    def test_concurrent_orders_share_one_commit(self):
+        fake = self.use_commit(lambda serial, attempt: code_pb2.OK)
+        results = self.save_orders('KPL-1', 'KPL-2', 'KPL-3')
+        for result in results:
+            self.assertIsNotNone(result.result())
+        self.assertEqual(len(fake.calls), 1)
+        self.assertEqual(sorted(fake.calls[0]), ['KPL-1', 'KPL-2', 'KPL-3'])
+        self.assertEqual(app._queued_writes, [])
+
+    def test_non_retryable_write_error_fails_only_that_order(self):
+        fake = self.use_commit(
+            lambda serial, attempt: code_pb2.ALREADY_EXISTS if serial == 'BAD' else code_pb2.OK)
+        bad, good = self.save_orders('BAD', 'GOOD')
+        with self.assertRaises(app.OrderAlreadyExists):
+            bad.result()
+        self.assertIsNotNone(good.result())
+        self.assertEqual(len(fake.calls), 1) # Not retried
+
+        # Later orders are still sent
+        later, = self.save_orders('LATER')
+        self.assertIsNotNone(later.result())
+        self.assertEqual(fake.calls[-1], ['LATER'])
+
+    def test_retryable_write_error_is_retried(self):
+        fake = self.use_commit(
+            lambda serial, attempt: code_pb2.UNAVAILABLE if attempt == 1 else code_pb2.OK)
+        result, = self.save_orders('KPL-1')
+        self.assertIsNotNone(result.result())
+        self.assertEqual(fake.calls, [['KPL-1'], ['KPL-1']])
+
+    def test_rpc_error_is_retried_then_fails_the_order(self):
+        fake = self.use_commit(lambda serial, attempt: api_exceptions.ServiceUnavailable("down"))
+        result, = self.save_orders('KPL-1')
+        with self.assertRaises(api_exceptions.ServiceUnavailable):
+            result.result()
+        self.assertEqual(len(fake.calls), app.ORDER_WRITE_MAX_ATTEMPTS)
+        self.assertEqual(app._queued_writes, [])
+
+    def test_non_retryable_rpc_error_fails_immediately(self):
+        fake = self.use_commit(lambda serial, attempt: api_exceptions.PermissionDenied("no"))
+        result, = self.save_orders('KPL-1')
+        with self.assertRaises(api_exceptions.PermissionDenied):
+            result.result()
+        self.assertEqual(len(fake.calls), 1)
+
+    def test_slow_batch_does_not_hold_up_later_batches(self):
+        def outcome(serial, attempt):
+            if serial == 'SLOW':
+                time.sleep(0.5)
+            return code_pb2.OK
+        self.use_commit(outcome)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            slow = pool.submit(app.save_order, app.ORDERS.document('SLOW'), {"serialNumber": "SLOW"})
+            while not app._queued_writes:
+                time.sleep(0.001)
+            app.flush_order_writes()
+
+            started = time.monotonic()
+            fast, = self.save_orders('FAST')
+            self.assertIsNotNone(fast.result())
+            self.assertLess(time.monotonic() - started, 0.3)
+            self.assertFalse(slow.done())
+            self.assertIsNotNone(slow.result())
+
+    def test_timed_out_order_is_not_sent_later(self):
+        fake = self.use_commit(lambda serial, attempt: code_pb2.OK)
+        app._writes_queued.clear()
+        with mock.patch.object(app, 'ORDER_WRITE_TIMEOUT', 0.05):
+            with self.assertRaises(FutureTimeoutError):
+                app.save_order(app.ORDERS.document('KPL-1'), {"serialNumber": "KPL-1"})
+        self.assertTrue(app._writes_queued.is_set()) # The flusher was woken up
+        for batch in app.flush_order_writes():
+            batch.result()
+        self.assertEqual(fake.calls, [])
+        self.assertEqual(app._queued_writes, [])
+
+    def test_flusher_survives_unexpected_errors(self):
+        with mock.patch.object(app, 'flush_order_writes', side_effect=[RuntimeError("boom"), SystemExit]), \
+                mock.patch.object(app, '_writes_queued') as writes_queued, \
+                mock.patch.object(app.time, 'sleep'):
+            with self.assertRaises(SystemExit):
+                app._flush_orders_when_queued()
+        self.assertEqual(writes_queued.wait.call_count, 2)
+
+
+class ReceiveOrderTest(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(app, 'ORDERS', mock.MagicMock()),
+            mock.patch.object(app, 'save_order'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        app.order_cache.clear()
+        self.client = app.app.test_client()
+
+    def post_order(self):
+        return self.client.post('/receive-order', json={
+            "patientName": "Asha", "tests": [{"name": "CBC", "id": 1, "price": 5}],
+        })
+
+    def saved_serials(self):
+        return [call.args[1]["serialNumber"] for call in app.save_order.call_args_list]
+
+    def test_serial_collision_retries_with_a_new_serial(self):
+        app.save_order.side_effect = [app.OrderAlreadyExists("taken"), None]
+        response = self.post_order()
+        self.assertEqual(response.status_code, 200)
+        first, second = self.saved_serials()
+        self.assertNotEqual(first, second)
+        self.assertEqual(response.get_json()["serialNumber"], second)
+        self.assertIsNone(app.get_cached_order(first))
+        self.assertEqual(app.get_cached_order(second)["patientName"], "Asha")
+
+    def test_repeated_collisions_return_an_error(self):
+        app.save_order.side_effect = app.OrderAlreadyExists("taken")
+        response = self.post_order()
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(response.get_json()["success"])
+        self.assertNotIn("serialNumber", response.get_json())
+        self.assertEqual(len(self.saved_serials()), app.SERIAL_MAX_ATTEMPTS)
+        self.assertEqual(len(app.order_cache), 0)
+
+    def test_rejects_non_json_body(self):
+        response = self.client.post('/receive-order', data='{"patientName": "Asha"}', content_type='text/plain')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.get_json()["success"])
+        app.save_order.assert_not_called()
+
+    def test_rejects_oversized_body(self):
+        body = '{"patientName": "%s"}' % ('x' * app.MAX_JSON_BODY_SIZE)
+        response = self.client.post('/receive-order', data=body, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        app.save_order.assert_not_called()
+
+    def test_rejects_tests_that_are_not_a_list_of_objects(self):
+        for tests in ("CBC", {"name": "CBC"}, ["CBC"]):
+            with self.subTest(tests=tests):
+                response = self.client.post('/receive-order', json={"patientName": "Asha", "tests": tests})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.get_json()["message"], "Tests must be a list of test objects.")
+        app.save_order.assert_not_called()
+
+    def test_keeps_extra_test_fields(self):
+        tests = [{"name": "CBC", "id": 1, "price": 5, "fasting": True}]
+        response = self.client.post('/receive-order', json={"patientName": "Asha", "tests": tests})
+        self.assertEqual(response.get_json()["selected_tests"], tests)
+        self.assertEqual(app.save_order.call_args.args[1]["tests"], tests)
+
+
+class OrderStatusTest(unittest.TestCase):
+    def setUp(self):
+        self.orders = mock.MagicMock()
+        self.document = self.orders.document.return_value
+        self.document.get.return_value.exists = True
+        self.document.get.return_value.to_dict.side_effect = lambda: {
+            "serialNumber": "KPL-1",
+            "patientName": "Asha",
+            "orderDate": DatetimeWithNanoseconds(2025, 5, 31, 12, 3, 4, tzinfo=datetime.timezone.utc),
+        }
+        patch = mock.patch.object(app, 'get_orders_collection', return_value=self.orders)
+        patch.start()
+        self.addCleanup(patch.stop)
+        app.order_cache.clear()
+        self.client = app.app.test_client()
+
+    def test_get_success_is_cacheable_and_cached(self):
+        response = self.client.get('/get-order-status/KPL-1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Cache-Control'], app.ORDER_STATUS_CACHE_CONTROL)
+        self.assertEqual(response.get_json()["order"]["orderDate"], "2025-05-31 12:03:04")
+        self.orders.document.assert_called_once_with('KPL-1')
+
+        self.client.get('/get-order-status/KPL-1')
+        self.assertEqual(self.document.get.call_count, 1) # Second lookup served from order_cache
+
+    def test_get_not_found_is_not_cacheable(self):
+        self.document.get.return_value.exists = False
+        response = self.client.get('/get-order-status/KPL-404')
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('Cache-Control', response.headers)
+        self.assertIsNone(app.get_cached_order('KPL-404'))
+
+    def test_get_error_is_not_cacheable(self):
+        self.document.get.side_effect = api_exceptions.ServiceUnavailable("down")
+        response = self.client.get('/get-order-status/KPL-1')
+        self.assertEqual(response.status_code, 500)
+        self.assertNotIn('Cache-Control', response.headers)
+
+    def test_fresh_bypasses_the_cache(self):
+        app.cache_order('KPL-1', {"serialNumber": "KPL-1", "patientName": "Stale"})
+        cached = self.client.get('/get-order-status/KPL-1')
+        self.assertEqual(cached.get_json()["order"]["patientName"], "Stale")
+        self.document.get.assert_not_called()
+
+        fresh = self.client.get('/get-order-status/KPL-1?fresh=1')
+        self.assertEqual(fresh.get_json()["order"]["patientName"], "Asha")
+        self.document.get.assert_called_once()
+        self.assertEqual(app.get_cached_order('KPL-1')["patientName"], "Asha")
+
+    def test_post_lookup(self):
+        response = self.client.post('/get-order-status', json={"serialNumber": "KPL-1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["order"]["patientName"], "Asha")
+        self.assertNotIn('Cache-Control', response.headers)
+
+    def test_post_rejects_non_json_and_missing_serial(self):
+        response = self.client.post('/get-order-status', data='KPL-1', content_type='text/plain')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()["message"], "Request must be JSON.")
+        response = self.client.post('/get-order-status', json={})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()["message"], "Serial number is required.")
+        self.orders.document.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()